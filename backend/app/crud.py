@@ -0,0 +1,33 @@
+from sqlalchemy.orm import Session
+from typing import Optional
+from . import models
+
+PREVIEW_LENGTH = 100
+
+def add_message(db: Session, history: models.ChatHistory, sender: str, content: str, model_name: Optional[str] = None, tokens: int = 0):
+    """写入一条消息，并增量更新会话的 updated_at 与摘要；由调用方负责 commit"""
+    db_message = models.ChatMessage(sender=sender, content=content, history_id=history.id)
+    db.add(db_message)
+    # created_at 的默认值在 flush 时才生成，这里先 flush 以便同步 updated_at
+    db.flush()
+    history.updated_at = db_message.created_at
+    # 计数在 SQL 端自增，避免用户消息与 AI 回复在不同会话中并发写入时丢失更新
+    values = {
+        models.ChatHistorySummary.message_count: models.ChatHistorySummary.message_count + 1,
+        models.ChatHistorySummary.token_total: models.ChatHistorySummary.token_total + (tokens or 0),
+        models.ChatHistorySummary.last_message_preview: (content or "")[:PREVIEW_LENGTH],
+    }
+    if model_name:
+        values[models.ChatHistorySummary.last_model] = model_name
+    updated = db.query(models.ChatHistorySummary).filter(
+        models.ChatHistorySummary.history_id == history.id
+    ).update(values, synchronize_session=False)
+    if not updated:
+        db.add(models.ChatHistorySummary(
+            history_id=history.id,
+            message_count=1,
+            token_total=tokens or 0,
+            last_message_preview=(content or "")[:PREVIEW_LENGTH],
+            last_model=model_name,
+        ))
+    return db_message
@@ -0,0 +1,226 @@
+import math
+import threading
+import time
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+# 连接超时固定，不参与自适应（秒）
+CONNECT_TIMEOUT = 5.0
+# 样本不足时使用的保守默认值（秒）
+# total：流式调用是整个调用的截止时间；非流式/标题调用作为 requests 的读超时使用，限制的是单次读取
+DEFAULT_TIMEOUTS = {"first_byte": 60.0, "idle": 30.0, "total": 120.0}
+# 自适应超时的上下限（秒）
+TIMEOUT_BOUNDS = {
+    "first_byte": (5.0, 120.0),
+    "idle": (3.0, 60.0),
+    "total": (15.0, 300.0),
+}
+# 超时 = 对应 p99 * 倍数
+TIMEOUT_FACTORS = {"first_byte": 3.0, "idle": 5.0, "total": 2.0}
+MIN_SAMPLES = 20
+# 统计窗口按样本数轮转，分位数只基于最近一到两个窗口内的样本；流量低时也不会因空闲而丢失数据
+WINDOW_SAMPLES = 200
+# 每次流式调用会产生大量 token 间隔样本，窗口相应放大
+GAP_WINDOW_SAMPLES = 5000
+
+# 调用类型：流式对话、非流式对话、标题生成，各自单独统计
+KINDS = ("stream", "non_stream", "title")
+
+class QuantileSketch:
+    """对数分桶的流式分位数草图，相对误差约为 accuracy，内存只与数值范围有关"""
+
+    def __init__(self, accuracy: float = 0.02, min_value: float = 1e-3):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        value = max(value, self.min_value)
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other: "QuantileSketch"):
+        for key, n in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # 取桶的中点作为估计值
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max if self.count else None,
+        }
+
+class WindowedSketch:
+    """轮转的两个草图：当前窗口满 window 个样本时丢弃上一窗口，使分位数跟随上游当前的表现"""
+
+    def __init__(self, window: int = WINDOW_SAMPLES):
+        self.window = window
+        self.current = QuantileSketch()
+        self.previous = QuantileSketch()
+
+    def add(self, value: float):
+        if self.current.count >= self.window:
+            self.current, self.previous = QuantileSketch(), self.current
+        self.current.add(value)
+
+    def merged(self):
+        sketch = QuantileSketch()
+        sketch.merge(self.previous)
+        sketch.merge(self.current)
+        return sketch
+
+class LatencyStats:
+    def __init__(self):
+        self.ttft = WindowedSketch()
+        self.gap = WindowedSketch(GAP_WINDOW_SAMPLES)
+        self.duration = WindowedSketch()
+        self.errors = 0
+        self.timeouts = 0
+
+_stats = {}
+_lock = threading.Lock()
+
+def _get(key):
+    stats = _stats.get(key)
+    if stats is None:
+        stats = _stats[key] = LatencyStats()
+    return stats
+
+def _clamp(name: str, value: float):
+    low, high = TIMEOUT_BOUNDS[name]
+    return min(max(value, low), high)
+
+def timeouts(provider: str, model: str, kind: str):
+    """根据最近窗口内的延迟计算 first_byte/idle/total 超时，样本不足时回退默认值；connect 固定"""
+    result = dict(DEFAULT_TIMEOUTS)
+    with _lock:
+        stats = _stats.get((provider, model, kind))
+        if stats is not None:
+            sketches = {"first_byte": stats.ttft, "idle": stats.gap, "total": stats.duration}
+            for name, windowed in sketches.items():
+                sketch = windowed.merged()
+                if sketch.count >= MIN_SAMPLES:
+                    result[name] = _clamp(name, sketch.quantile(0.99) * TIMEOUT_FACTORS[name])
+    # 首字节超时不应超过总时长超时
+    result["first_byte"] = min(result["first_byte"], result["total"])
+    result["connect"] = CONNECT_TIMEOUT
+    return result
+
+def snapshot():
+    with _lock:
+        items = [
+            {
+                "provider": provider,
+                "model": model,
+                "kind": kind,
+                "ttft": stats.ttft.merged().summary(),
+                "inter_token_gap": stats.gap.merged().summary(),
+                "duration": stats.duration.merged().summary(),
+                "errors": stats.errors,
+                "timeouts": stats.timeouts,
+            }
+            for (provider, model, kind), stats in _stats.items()
+        ]
+    for item in items:
+        item["effective_timeouts"] = timeouts(item["provider"], item["model"], item["kind"])
+    return items
+
+class DeadlineExceeded(Exception):
+    """流式调用超过整体截止时间"""
+
+def _is_timeout(exc):
+    # 只有读超时才说明上游慢；连接失败（含 ConnectTimeout）与延迟分布无关，只计入 errors
+    if isinstance(exc, (requests.exceptions.ReadTimeout, DeadlineExceeded)):
+        return True
+    # 流式读取中的读超时会被 requests 包装成 ConnectionError
+    return bool(exc.args) and isinstance(exc.args[0], ReadTimeoutError)
+
+class Tracker:
+    """记录一次上游调用的 TTFT、token 间隔与总耗时；超时的调用按超时值记为截尾样本"""
+
+    def __init__(self, provider: str, model: str, kind: str, limits: dict):
+        self.key = (provider, model, kind)
+        self.limits = limits
+        self.start = time.monotonic()
+        self.first = None
+        self.last = None
+        self.gaps = []
+
+    def token(self):
+        now = time.monotonic()
+        if self.first is None:
+            self.first = now
+        else:
+            self.gaps.append(now - self.last)
+        self.last = now
+
+    def check_deadline(self):
+        """流式调用每收到一行调用一次，超过 total 时抛出 DeadlineExceeded"""
+        if time.monotonic() - self.start > self.limits["total"]:
+            raise DeadlineExceeded(f"上游响应超过 {self.limits['total']:.0f} 秒截止时间")
+
+    def finish(self, ok: bool = True, exc: Exception = None):
+        end = time.monotonic()
+        timed_out = exc is not None and _is_timeout(exc)
+        with _lock:
+            stats = _get(self.key)
+            if not ok and not timed_out:
+                stats.errors += 1
+                return
+            # 非流式调用没有 token 事件，只记录总耗时
+            if self.first is not None:
+                stats.ttft.add(self.first - self.start)
+            for gap in self.gaps:
+                stats.gap.add(gap)
+            if not timed_out:
+                stats.duration.add(end - self.start)
+                return
+            # 超时说明真实耗时至少为超时值，按超时值记样本，使超时能随上游变慢而回升
+            stats.timeouts += 1
+            if isinstance(exc, DeadlineExceeded):
+                stats.duration.add(self.limits["total"])
+            elif self.key[2] == "stream":
+                if self.first is None:
+                    stats.ttft.add(self.limits["first_byte"])
+                else:
+                    stats.gap.add(self.limits["idle"])
+            else:
+                stats.duration.add(max(end - self.start, self.limits["total"]))
+
+_warned_read_timeout = False
+
+def set_read_timeout(resp, seconds: float):
+    """收到首个 token 后把底层 socket 的读超时从首字节超时收紧为 idle 超时"""
+    global _warned_read_timeout
+    sock = getattr(getattr(resp.raw, "connection", None), "sock", None)
+    if sock is None:
+        if not _warned_read_timeout:
+            _warned_read_timeout = True
+            print("[latency] 无法获取上游连接的 socket，idle 超时未生效")
+        return
+    sock.settimeout(seconds)
@@ -1,7 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .database import Base, engine
-from .routers import users, chat, model_providers, settings
+from . import migrations
+from .routers import users, chat, model_providers, settings, admin
 
 app = FastAPI()
 
@@ -15,8 +16,10 @@ app.add_middleware(
 )
 
 Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 app.include_router(users.router, prefix="/auth", tags=["auth"])
 app.include_router(model_providers.router, prefix="/model_providers", tags=["model_providers"])
 app.include_router(chat.router, prefix="/chat", tags=["chat"])
 app.include_router(settings.router, prefix="/settings", tags=["settings"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
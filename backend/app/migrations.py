@@ -0,0 +1,36 @@
+from sqlalchemy import func, inspect, text
+from . import models, crud
+from .database import SessionLocal
+
+def upgrade(engine):
+    """一次性数据迁移：补齐索引与新增列、回填 updated_at、为旧会话生成摘要；可重复执行"""
+    for index in models.ChatHistory.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    # create_all 不会给已存在的表加列，这里补齐 models 表的模型级默认参数列
+    model_columns = {c["name"] for c in inspect(engine).get_columns(models.Model.__tablename__)}
+    with engine.begin() as conn:
+        for name, ddl in (("temperature", "FLOAT"), ("max_tokens", "INTEGER")):
+            if name not in model_columns:
+                conn.execute(text(f"ALTER TABLE {models.Model.__tablename__} ADD COLUMN {name} {ddl}"))
+    db = SessionLocal()
+    try:
+        db.query(models.ChatHistory).filter(models.ChatHistory.updated_at.is_(None)).update(
+            {models.ChatHistory.updated_at: models.ChatHistory.created_at}, synchronize_session=False
+        )
+        missing = db.query(models.ChatHistory.id).outerjoin(models.ChatHistorySummary).filter(
+            models.ChatHistorySummary.history_id.is_(None)
+        ).all()
+        for (history_id,) in missing:
+            count = db.query(func.count(models.ChatMessage.id)).filter(models.ChatMessage.history_id == history_id).scalar()
+            last = db.query(models.ChatMessage).filter(models.ChatMessage.history_id == history_id).order_by(
+                models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc()
+            ).first()
+            db.add(models.ChatHistorySummary(
+                history_id=history_id,
+                message_count=count or 0,
+                last_message_preview=(last.content or "")[:crud.PREVIEW_LENGTH] if last else None,
+                token_total=0,
+            ))
+        db.commit()
+    finally:
+        db.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float, Text, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 import datetime
@@ -30,6 +30,9 @@ class Model(Base):
     id = Column(Integer, primary_key=True, index=True)
     provider_id = Column(Integer, ForeignKey("model_providers.id"))
     name = Column(String)
+    # 模型级默认生成参数，为空时使用全局默认；用户设置优先于此
+    temperature = Column(Float, nullable=True)
+    max_tokens = Column(Integer, nullable=True)
     provider = relationship("ModelProvider", back_populates="models")
 
 class ChatHistory(Base):
@@ -41,6 +44,8 @@ class ChatHistory(Base):
     updated_at = Column(DateTime, default=datetime.datetime.utcnow)
     user = relationship("User", back_populates="histories")
     messages = relationship("ChatMessage", back_populates="history")
+    summary = relationship("ChatHistorySummary", back_populates="history", uselist=False, cascade="all, delete-orphan")
+    __table_args__ = (Index("ix_chat_histories_user_updated", "user_id", "updated_at"),)
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -51,11 +56,21 @@ class ChatMessage(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     history = relationship("ChatHistory", back_populates="messages")
 
+class ChatHistorySummary(Base):
+    __tablename__ = "chat_history_summaries"
+    history_id = Column(Integer, ForeignKey("chat_histories.id"), primary_key=True)
+    message_count = Column(Integer, default=0)
+    last_message_preview = Column(String)
+    last_model = Column(String)
+    token_total = Column(Integer, default=0)
+    history = relationship("ChatHistory", back_populates="summary")
+
 class ChatSetting(Base):
     __tablename__ = "chat_settings"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    temperature = Column(Float, default=0.7)
-    max_tokens = Column(Integer, default=2048)
+    # 为空表示用户未显式设置，由模型默认/全局默认决定
+    temperature = Column(Float, nullable=True)
+    max_tokens = Column(Integer, nullable=True)
     stream = Column(Boolean, default=True)
     user = relationship("User", back_populates="settings")
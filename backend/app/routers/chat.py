@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Header, BackgroundTasks, Body
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer
-from .. import models, schemas, database, auth
+from .. import models, schemas, database, auth, settings_cache, crud, latency
 from typing import List, Optional
 from datetime import datetime
 import requests
@@ -33,18 +33,30 @@ def get_token_from_header_or_query(
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-@router.get("/histories", response_model=List[schemas.ChatHistoryOut])
+@router.get("/histories", response_model=List[schemas.ChatHistorySummaryOut])
 def list_histories(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(database.get_db),
     user: models.User = Depends(get_token_from_header_or_query)
 ):
-    histories = db.query(models.ChatHistory).filter(models.ChatHistory.user_id == user.id).order_by(models.ChatHistory.updated_at.desc()).all()
-    # 防御性修复：自动补齐 updated_at 为 None 的数据
-    for h in histories:
-        if h.updated_at is None:
-            h.updated_at = h.created_at
-            db.commit()
-    return histories
+    # 摘要随消息写入增量维护，这里一次联表查询即可返回预览与计数
+    query = db.query(models.ChatHistory, models.ChatHistorySummary).outerjoin(models.ChatHistorySummary).filter(
+        models.ChatHistory.user_id == user.id
+    ).order_by(models.ChatHistory.updated_at.desc(), models.ChatHistory.id.desc()).offset(offset).limit(limit)
+    result = []
+    for h, summary in query.all():
+        result.append({
+            "id": h.id,
+            "title": h.title,
+            "created_at": h.created_at,
+            "updated_at": h.updated_at,
+            "message_count": summary.message_count if summary else 0,
+            "last_message_preview": summary.last_message_preview if summary else None,
+            "last_model": summary.last_model if summary else None,
+            "token_total": summary.token_total if summary else 0,
+        })
+    return result
 
 @router.post("/histories", response_model=schemas.ChatHistoryOut)
 def create_history(
@@ -54,6 +66,7 @@ def create_history(
 ):
     now = datetime.utcnow()
     db_history = models.ChatHistory(**history.dict(), user_id=user.id, created_at=now, updated_at=now)
+    db_history.summary = models.ChatHistorySummary(message_count=0, token_total=0)
     db.add(db_history)
     db.commit()
     db.refresh(db_history)
@@ -98,8 +111,8 @@ def list_messages(
     content: str = Query(None),
     model_id: int = Query(None),
     provider_id: int = Query(None),
-    temperature: float = Query(0.7),
-    max_tokens: int = Query(2048),
+    temperature: Optional[float] = Query(None),
+    max_tokens: Optional[int] = Query(None),
     db: Session = Depends(database.get_db),
     user: models.User = Depends(get_token_from_header_or_query),
     background_tasks: BackgroundTasks = None
@@ -123,10 +136,10 @@ def list_messages(
     model = {
         "name": model_obj.name
     }
+    # 生成参数以服务端设置为准，请求参数仅作为覆盖
+    gen = settings_cache.resolve(db, user.id, model_obj, temperature=temperature, max_tokens=max_tokens)
 
-    db_message = models.ChatMessage(sender=sender, content=content, history_id=history_id)
-    db.add(db_message)
-    db_history.updated_at = db_message.created_at
+    db_message = crud.add_message(db, db_history, sender, content, model_name=model_obj.name)
     db.commit()
     db.refresh(db_message)
 
@@ -134,6 +147,8 @@ def list_messages(
 
     def event_stream():
         ai_reply = ""
+        ai_tokens = 0
+        tracker = None
         try:
             api_host = provider["api_host"].rstrip("/")
             url = f"{api_host}/v1/chat/completions"
@@ -146,30 +161,56 @@ def list_messages(
             data = {
                 "model": model["name"],
                 "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
+                "temperature": gen["temperature"],
+                "max_tokens": gen["max_tokens"],
                 "stream": True,
+                # 流式响应默认不带 usage，需显式请求才能统计 token_total
+                "stream_options": {"include_usage": True},
             }
             print(f"[SSE] 请求LLM: {url}, data={data}")
-            with requests.post(url, headers=headers, json=data, stream=True, timeout=120) as resp:
+            t = latency.timeouts(api_host, model["name"], "stream")
+            tracker = latency.Tracker(api_host, model["name"], "stream", t)
+            resp = requests.post(url, headers=headers, json=data, stream=True, timeout=(t["connect"], t["first_byte"]))
+            if resp.status_code == 400:
+                # 部分 OpenAI 兼容实现不认识 stream_options，去掉后重试一次（此时 token_total 不计入本轮）
+                resp.close()
+                data.pop("stream_options")
+                resp = requests.post(url, headers=headers, json=data, stream=True, timeout=(t["connect"], t["first_byte"]))
+            if not resp.ok:
+                # 非 2xx 的错误体不是 SSE，记为失败调用后按异常路径返回错误
+                tracker.finish(ok=False)
+                tracker = None
+                with resp:
+                    resp.raise_for_status()
+            with resp:
                 for line in resp.iter_lines():
                     if line:
+                        tracker.check_deadline()
                         line = line.decode('utf-8')
                         if line.startswith('data:'):
+                            # 只有 data 行计入 token 间隔，SSE 注释与保活行不算
+                            if tracker.first is None:
+                                latency.set_read_timeout(resp, t["idle"])
+                            tracker.token()
                             line = line[len('data:'):].lstrip()
                         if line == '[DONE]':
                             break
                         try:
                             payload = json.loads(line)
-                            delta = payload.get("choices", [{}])[0].get("delta", {}).get("content", "")
+                            delta = (payload.get("choices") or [{}])[0].get("delta", {}).get("content") or ""
                             ai_reply += delta
+                            if payload.get("usage"):
+                                ai_tokens = payload["usage"].get("total_tokens") or ai_tokens
                             print(f"[SSE] 累计AI delta: {delta}")
                         except Exception as e:
                             print(f"[SSE] delta解析异常: {e}, line={line}")
                         # 关键：始终加data:前缀，且确保为utf-8字节串
                         yield f"data: {line}\n\n".encode("utf-8")
+            tracker.finish()
         except Exception as e:
             print("[SSE] error:", e)
+            if tracker is not None:
+                tracker.finish(ok=False, exc=e)
             # 确保错误信息为utf-8字节串
             yield f"data: {{\"error\": \"{str(e)}\"}}\n\n".encode("utf-8")
         print(f"[SSE] yield: [DONE], ai_reply=<{ai_reply}>")
@@ -180,9 +221,7 @@ def list_messages(
             db_ai = SessionLocal()
             try:
                 db_history2 = db_ai.query(models.ChatHistory).filter(models.ChatHistory.id == history_id).first()
-                db_reply = models.ChatMessage(sender="ai", content=ai_reply, history_id=history_id)
-                db_ai.add(db_reply)
-                db_history2.updated_at = db_reply.created_at
+                db_reply = crud.add_message(db_ai, db_history2, "ai", ai_reply, model_name=model["name"], tokens=ai_tokens)
                 db_ai.commit()
                 db_ai.refresh(db_reply)
             finally:
@@ -207,9 +246,9 @@ def list_messages(
 def create_message(
     history_id: int,
     message: schemas.ChatMessageCreate,
-    temperature: float = Body(0.7),
-    max_tokens: int = Body(2048),
-    stream: bool = Body(True),
+    temperature: Optional[float] = Body(None),
+    max_tokens: Optional[int] = Body(None),
+    stream: Optional[bool] = Body(None),
     db: Session = Depends(database.get_db),
     user: models.User = Depends(get_token_from_header_or_query)
 ):
@@ -226,15 +265,18 @@ def create_message(
     if not provider or not model:
         raise HTTPException(status_code=400, detail="模型或供应商不存在")
 
+    # 生成参数以服务端设置为准，请求参数仅作为覆盖
+    gen = settings_cache.resolve(db, user.id, model, temperature=temperature, max_tokens=max_tokens, stream=stream)
+    temperature, max_tokens, stream = gen["temperature"], gen["max_tokens"], gen["stream"]
+
     # 1. 存储用户消息
-    db_message = models.ChatMessage(sender=message.sender, content=message.content, history_id=history_id)
-    db.add(db_message)
-    db_history.updated_at = db_message.created_at
+    db_message = crud.add_message(db, db_history, message.sender, message.content, model_name=model.name)
     db.commit()
     db.refresh(db_message)
 
     if stream:
         def event_stream():
+            tracker = None
             try:
                 api_host = provider.api_host.rstrip("/")
                 url = f"{api_host}/v1/chat/completions"
@@ -251,11 +293,25 @@ def create_message(
                     "max_tokens": max_tokens,
                     "stream": True,
                 }
-                with requests.post(url, headers=headers, json=data, stream=True, timeout=120) as resp:
+                t = latency.timeouts(api_host, model.name, "stream")
+                tracker = latency.Tracker(api_host, model.name, "stream", t)
+                with requests.post(url, headers=headers, json=data, stream=True, timeout=(t["connect"], t["first_byte"])) as resp:
+                    if not resp.ok:
+                        tracker.finish(ok=False)
+                        tracker = None
+                        resp.raise_for_status()
                     for line in resp.iter_lines():
+                        if line:
+                            tracker.check_deadline()
                         if line and line.startswith(b"data: "):
+                            if tracker.first is None:
+                                latency.set_read_timeout(resp, t["idle"])
+                            tracker.token()
                             yield line.decode() + "\n"
+                tracker.finish()
             except Exception as e:
+                if tracker is not None:
+                    tracker.finish(ok=False, exc=e)
                 yield f"data: {{\"error\": \"{str(e)}\"}}\n"
         return StreamingResponse(event_stream(), media_type="text/event-stream")
     else:
@@ -278,20 +334,28 @@ def create_message(
                 "stream": False,
             }
             print(f"[非流式] 请求 LLM: url={url}, headers={headers}, data={data}")
-            resp = requests.post(url, headers=headers, json=data, timeout=60)
+            t = latency.timeouts(api_host, model.name, "non_stream")
+            tracker = latency.Tracker(api_host, model.name, "non_stream", t)
+            try:
+                resp = requests.post(url, headers=headers, json=data, timeout=(t["connect"], t["total"]))
+            except Exception as e:
+                tracker.finish(ok=False, exc=e)
+                raise
+            tracker.finish(ok=resp.ok)
             print(f"[非流式] LLM 响应状态码: {resp.status_code}")
             print(f"[非流式] LLM 响应内容: {resp.text}")
             resp.raise_for_status()
-            reply = resp.json()["choices"][0]["message"]["content"]
+            resp_json = resp.json()
+            reply = resp_json["choices"][0]["message"]["content"]
+            tokens = (resp_json.get("usage") or {}).get("total_tokens") or 0
             print(f"[非流式] LLM reply: {reply}")
         except Exception as e:
             reply = f"LLM调用失败: {e}"
+            tokens = 0
             print(f"[非流式] LLM 调用异常: {e}")
 
         # 3. 存储 LLM 回复
-        db_reply = models.ChatMessage(sender="ai", content=reply, history_id=history_id)
-        db.add(db_reply)
-        db_history.updated_at = db_reply.created_at
+        db_reply = crud.add_message(db, db_history, "ai", reply, model_name=model.name, tokens=tokens)
         db.commit()
         db.refresh(db_reply)
         print(f"[非流式] 存储 db_reply: id={db_reply.id}, content={db_reply.content}")
@@ -321,8 +385,17 @@ def generate_title(
         "max_tokens": 40,
         "stream": False
     }
+    t = latency.timeouts(api_host, model.name, "title")
+    # 标题生成只需几十个 token，总时长超时不超过 30 秒
+    t["total"] = min(t["total"], 30)
+    tracker = latency.Tracker(api_host, model.name, "title", t)
     try:
-        resp = requests.post(url, headers=headers, json=data, timeout=30)
+        try:
+            resp = requests.post(url, headers=headers, json=data, timeout=(t["connect"], t["total"]))
+        except Exception as e:
+            tracker.finish(ok=False, exc=e)
+            raise
+        tracker.finish(ok=resp.ok)
         resp.raise_for_status()
         reply = resp.json()["choices"][0]["message"]["content"].strip()
     except Exception as e:
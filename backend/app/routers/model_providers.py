@@ -51,7 +51,7 @@ def delete_provider(provider_id: int, db: Session = Depends(database.get_db), us
 @router.get("/models")
 def list_models(provider_id: int, db: Session = Depends(database.get_db), user: models.User = Depends(get_current_user)):
     models_list = db.query(models.Model).filter(models.Model.provider_id == provider_id).all()
-    return [{"id": m.id, "name": m.name, "provider_id": m.provider_id} for m in models_list]
+    return [{"id": m.id, "name": m.name, "provider_id": m.provider_id, "temperature": m.temperature, "max_tokens": m.max_tokens} for m in models_list]
 
 @router.post("/models", response_model=schemas.ModelOut)
 def create_model(model: schemas.ModelCreate, db: Session = Depends(database.get_db), user: models.User = Depends(get_current_user)):
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer
-from .. import models, schemas, database, auth
+from .. import models, schemas, database, auth, settings_cache
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -20,11 +20,9 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
 def get_settings(db: Session = Depends(database.get_db), user: models.User = Depends(get_current_user)):
     settings = db.query(models.ChatSetting).filter(models.ChatSetting.user_id == user.id).first()
     if not settings:
-        # 默认配置
-        settings = models.ChatSetting(user_id=user.id, temperature=0.7, max_tokens=2048, stream=True)
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
+        # 未保存过设置时不落库，生成参数留空，由模型默认/全局默认决定
+        return schemas.ChatSettingOut()
+    settings_cache.put(user.id, settings)
     return settings
 
 @router.put("/", response_model=schemas.ChatSettingOut)
@@ -38,4 +36,5 @@ def update_settings(update: schemas.ChatSettingUpdate, db: Session = Depends(dat
             setattr(settings, k, v)
     db.commit()
     db.refresh(settings)
+    settings_cache.put(user.id, settings)
     return settings
@@ -35,6 +35,8 @@ class ModelProviderOut(ModelProviderBase):
 
 class ModelBase(BaseModel):
     name: str
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
 
 class ModelCreate(ModelBase):
     provider_id: int
@@ -58,6 +60,12 @@ class ChatHistoryOut(ChatHistoryBase):
     class Config:
         orm_mode = True
 
+class ChatHistorySummaryOut(ChatHistoryOut):
+    message_count: int = 0
+    last_message_preview: Optional[str] = None
+    last_model: Optional[str] = None
+    token_total: int = 0
+
 class ChatMessageBase(BaseModel):
     sender: str
     content: str
@@ -74,15 +82,15 @@ class ChatMessageOut(ChatMessageBase):
         orm_mode = True
 
 class ChatSettingBase(BaseModel):
-    temperature: float
-    max_tokens: int
-    stream: bool
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    stream: bool = True
 
 class ChatSettingUpdate(ChatSettingBase):
     pass
 
 class ChatSettingOut(ChatSettingBase):
-    id: int
+    id: Optional[int] = None
     class Config:
         orm_mode = True
 
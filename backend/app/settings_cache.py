@@ -0,0 +1,60 @@
+from sqlalchemy.orm import Session
+from typing import Optional
+import threading
+import time
+from . import models
+
+# 全局默认生成参数，ChatSetting 与 Model 上未设置的字段回落到这里
+DEFAULT_SETTINGS = {"temperature": 0.7, "max_tokens": 2048, "stream": True}
+
+# 缓存快照的有效期（秒），多进程部署下其他 worker 最迟在此时间后读到新设置
+CACHE_TTL = 30
+
+_cache = {}
+_lock = threading.Lock()
+
+def _snapshot(setting: models.ChatSetting):
+    return {
+        "temperature": setting.temperature,
+        "max_tokens": setting.max_tokens,
+        "stream": setting.stream,
+    }
+
+def put(user_id: int, setting: models.ChatSetting):
+    """在设置写入数据库后刷新缓存中的快照"""
+    with _lock:
+        _cache[user_id] = (_snapshot(setting), time.monotonic() + CACHE_TTL)
+
+def get(db: Session, user_id: int):
+    """读取用户设置快照，缓存未命中或过期时回源数据库，用户未保存过设置时返回 None"""
+    with _lock:
+        cached = _cache.get(user_id)
+    if cached is not None and cached[1] > time.monotonic():
+        return dict(cached[0])
+    setting = db.query(models.ChatSetting).filter(models.ChatSetting.user_id == user_id).first()
+    if not setting:
+        with _lock:
+            _cache.pop(user_id, None)
+        return None
+    put(user_id, setting)
+    return _snapshot(setting)
+
+def resolve(
+    db: Session,
+    user_id: int,
+    model: Optional[models.Model] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    stream: Optional[bool] = None,
+):
+    """计算本轮对话实际使用的生成参数：请求覆盖 > 用户设置 > 模型默认 > 全局默认"""
+    effective = dict(DEFAULT_SETTINGS)
+    if model is not None:
+        model_defaults = {"temperature": model.temperature, "max_tokens": model.max_tokens}
+        effective.update({k: v for k, v in model_defaults.items() if v is not None})
+    user_settings = get(db, user_id)
+    if user_settings:
+        effective.update({k: v for k, v in user_settings.items() if v is not None})
+    overrides = {"temperature": temperature, "max_tokens": max_tokens, "stream": stream}
+    effective.update({k: v for k, v in overrides.items() if v is not None})
+    return effective
@@ -229,8 +229,8 @@ const MainArea = ({ selectedHistory, setSelectedHistory, fetchHistories }: MainA
       if (isFirst) {
         setLlmConfig(DEFAULT_LLM_CONFIG);
         localStorage.setItem('llmConfigInited', '1');
-        updateChatSettings(DEFAULT_LLM_CONFIG); // 强制保存到后端
-        console.log('[DEBUG] 强制用DEFAULT_LLM_CONFIG并保存', DEFAULT_LLM_CONFIG);
+        // 不再写回后端：未显式保存的参数由服务端按模型默认/全局默认解析
+        console.log('[DEBUG] 使用DEFAULT_LLM_CONFIG', DEFAULT_LLM_CONFIG);
       } else {
         setLlmConfig({
           temperature: typeof cfg?.temperature === 'number' ? cfg.temperature : 0.7,
@@ -474,7 +474,8 @@ const MainArea = ({ selectedHistory, setSelectedHistory, fetchHistories }: MainA
     selectedProviderId: number,
     signal?: AbortSignal
   ) => {
-    await sendChatMessage(historyId, "user", message, selectedModel, selectedProviderId, llmConfig.temperature, llmConfig.max_tokens, llmConfig.stream, signal);
+    // temperature/max_tokens 由服务端根据已保存设置解析，这里只传 stream
+    await sendChatMessage(historyId, "user", message, selectedModel, selectedProviderId, undefined, undefined, llmConfig.stream, signal);
   };
 
   // 2. 流式消息发送
@@ -490,9 +491,7 @@ const MainArea = ({ selectedHistory, setSelectedHistory, fetchHistories }: MainA
       sender: "user",
       content: message,
       model_id: String(selectedModel),
-      provider_id: String(selectedProviderId),
-      temperature: String(llmConfig.temperature),
-      max_tokens: String(llmConfig.max_tokens)
+      provider_id: String(selectedProviderId)
     });
     const token = localStorage.getItem("token");
     params.append('token', token || '');